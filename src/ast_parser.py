@@ -0,0 +1,166 @@
+from sly import Parser
+
+import cpl_ast as ast
+from errors import CPLSyntaxError
+from lexer import CPLLexer
+
+
+class CPLASTParser(Parser):
+    """Same grammar as CPLParser, but the reductions only build a cpl_ast tree.
+
+    No quads are generated while parsing, see CodeGenerator for that.
+    """
+
+    tokens = CPLLexer.tokens
+    literals = CPLLexer.literals
+
+    @_('declarations stmt_block')
+    def program(self, p):
+        return ast.Program(p.declarations, p.stmt_block)
+
+    @_('declarations declaration')
+    def declarations(self, p):
+        p.declarations.append(p.declaration)
+        return p.declarations
+
+    @_('')
+    def declarations(self, p):
+        return []
+
+    @_('idlist ":" type ";"')
+    def declaration(self, p):
+        return ast.Declaration(p.idlist, p.type)
+
+    @_('INT', 'FLOAT')
+    def type(self, p):
+        return p[0].lower()
+
+    @_('idlist "," ID')
+    def idlist(self, p):
+        p.idlist.append(p.ID)
+        return p.idlist
+
+    @_('ID')
+    def idlist(self, p):
+        return [p.ID]
+
+    @_('assignment_stmt', 'input_stmt', 'output_stmt', 'if_stmt', 'while_stmt', 'switch_stmt', 'break_stmt', 'stmt_block')
+    def stmt(self, p):
+        return p[0]
+
+    @_('ID "=" expression ";"')
+    def assignment_stmt(self, p):
+        return ast.Assign(p.ID, p.expression)
+
+    @_('INPUT "(" ID ")" ";"')
+    def input_stmt(self, p):
+        return ast.Input(p.ID)
+
+    @_('OUTPUT "(" expression ")" ";"')
+    def output_stmt(self, p):
+        return ast.Output(p.expression)
+
+    @_('IF "(" boolexpr ")" stmt_block')
+    def if_stmt(self, p):
+        return ast.If(p.boolexpr, p.stmt_block)
+
+    @_('IF "(" boolexpr ")" stmt_block ELSE stmt_block')
+    def if_stmt(self, p):
+        return ast.If(p.boolexpr, p.stmt_block0, p.stmt_block1)
+
+    @_('WHILE "(" boolexpr ")" stmt_block')
+    def while_stmt(self, p):
+        return ast.While(p.boolexpr, p.stmt_block)
+
+    @_('SWITCH "(" expression ")" "{" caselist DEFAULT ":" stmtlist "}"')
+    def switch_stmt(self, p):
+        return ast.Switch(p.expression, p.caselist, p.stmtlist)
+
+    @_('caselist CASE NUM ":" stmtlist')
+    def caselist(self, p):
+        p.caselist.append(ast.Case(p.NUM, p.stmtlist))
+        return p.caselist
+
+    @_('')
+    def caselist(self, p):
+        return []
+
+    @_('BREAK ";"')
+    def break_stmt(self, p):
+        return ast.Break()
+
+    @_('"{" stmtlist "}"')
+    def stmt_block(self, p):
+        return ast.Block(p.stmtlist)
+
+    @_('stmtlist stmt')
+    def stmtlist(self, p):
+        p.stmtlist.append(p.stmt)
+        return p.stmtlist
+
+    @_('stmt')
+    def stmtlist(self, p):
+        return [p.stmt]
+
+    @_('boolexpr OR boolterm')
+    def boolexpr(self, p):
+        return ast.BoolOp(p.OR, p.boolexpr, p.boolterm)
+
+    @_('boolterm AND boolfactor')
+    def boolterm(self, p):
+        return ast.BoolOp(p.AND, p.boolterm, p.boolfactor)
+
+    @_('boolterm')
+    def boolexpr(self, p):
+        return p.boolterm
+
+    @_('boolfactor')
+    def boolterm(self, p):
+        return p.boolfactor
+
+    @_('NOT "(" boolexpr ")"')
+    def boolfactor(self, p):
+        return ast.Not(p.boolexpr)
+
+    @_('expression RELOP expression')
+    def boolfactor(self, p):
+        return ast.RelOp(p.RELOP, p.expression0, p.expression1)
+
+    @_('expression ADDOP term')
+    def expression(self, p):
+        return ast.BinOp(p.ADDOP, p.expression, p.term)
+
+    @_('term')
+    def expression(self, p):
+        return p.term
+
+    @_('term MULOP factor')
+    def term(self, p):
+        return ast.BinOp(p.MULOP, p.term, p.factor)
+
+    @_('factor')
+    def term(self, p):
+        return p.factor
+
+    @_('"(" expression ")"')
+    def factor(self, p):
+        return p.expression
+
+    @_('CAST "(" expression ")"')
+    def factor(self, p):
+        cast_type = "int" if p.CAST == "static_cast<int>" else "float"
+        return ast.Cast(cast_type, p.expression)
+
+    @_('ID')
+    def factor(self, p):
+        return ast.Var(p.ID)
+
+    @_('NUM')
+    def factor(self, p):
+        return ast.Num(p.NUM)
+
+    def error(self, p):
+        if not p:
+            raise CPLSyntaxError("Unexpected end of file")
+
+        raise CPLSyntaxError(f"Unexpected token '{p.value}'", p.lineno)
@@ -0,0 +1,134 @@
+import numpy as np
+
+from errors import StepLimitExceeded
+from interpreter import QuadInterpreter
+
+
+def _int_div(a, b):
+    """Integer division truncating toward zero, like the quads"""
+    quotient = np.abs(a) // np.abs(b)
+    return np.where((a < 0) != (b < 0), -quotient, quotient)
+
+
+class BatchExecutor:
+    """Execute quads, as generated by QuadTranslator, on many input rows at once.
+
+    Every row has its own program counter. Each step executes the quad with the lowest
+    program counter for all the rows waiting on it, as one NumPy operation on the masked
+    rows, so rows that took different branches of a JMPZ join again after it.
+    Straight-line code runs once for the whole batch instead of once per row.
+    """
+
+    ARITH_OPS = {
+        "ADD": np.add,
+        "SUB": np.subtract,
+        "MLT": np.multiply,
+    }
+
+    REL_OPS = {
+        "EQL": np.equal,
+        "NQL": np.not_equal,
+        "LSS": np.less,
+        "GRT": np.greater,
+    }
+
+    def __init__(self, lines, max_steps=10_000_000):
+        self.code = [QuadInterpreter.decode(line) for line in lines]
+        self.max_steps = max_steps
+
+    def run(self, inputs):
+        """Run the program once per row of the 2-D array <inputs>: the n-th input() of a row
+        reads its n-th column. Return a 2-D float array whose n-th column holds the n-th
+        output() of each row, NaN where a row printed fewer values."""
+        inputs = np.asarray(inputs, dtype=np.float64)
+        if inputs.ndim != 2:
+            raise ValueError("inputs must be a 2-D array, one row per run")
+        rows = inputs.shape[0]
+        end = len(self.code)
+
+        env = {}
+        pc = np.zeros(rows, dtype=np.int64)
+        input_pos = np.zeros(rows, dtype=np.int64)
+        output_pos = np.zeros(rows, dtype=np.int64)
+        outputs = np.full((rows, 4), np.nan)
+
+        def value(arg, mask):
+            """Value of <arg> for the rows of <mask> (all the rows if None)"""
+            if not isinstance(arg, str):
+                return arg
+            var = env.get(arg)
+            if var is None:
+                return 0
+            return var if mask is None else var[mask]
+
+        def assign(name, result, mask, dtype):
+            if mask is None:
+                env[name] = np.broadcast_to(np.asarray(result).astype(dtype), rows).copy()
+                return
+            var = env.get(name)
+            var = np.zeros(rows, dtype=dtype) if var is None else var.astype(dtype, copy=False)
+            var[mask] = result
+            env[name] = var
+
+        steps = 0
+        while True:
+            waiting = pc[pc < end]
+            if waiting.size == 0:
+                break
+            steps += 1
+            if steps > self.max_steps:
+                raise StepLimitExceeded(self.max_steps)
+
+            current = waiting.min()
+            # None stands for all the rows, which avoids indexing in straight-line code
+            mask = None if waiting.size == rows and waiting.max() == current else pc == current
+            selected = slice(None) if mask is None else mask
+            op, args = self.code[current]
+
+            if op == "HALT":
+                pc[selected] = end
+                continue
+            if op in ("JUMP", "JMP"):
+                pc[selected] = args[0] - 1
+                continue
+            if op == "JMPZ":
+                pc[selected] = np.where(value(args[0], mask) == 0, args[1] - 1, current + 1)
+                continue
+
+            pc[selected] += 1
+            dtype = np.float64 if op[0] == "R" else np.int64
+            name = op[1:]
+            if name == "ASN":
+                assign(args[0], value(args[1], mask), mask, dtype)
+            elif name == "INP":
+                positions = input_pos[selected]
+                if positions.max() >= inputs.shape[1]:
+                    raise EOFError("Not enough input columns")
+                assign(args[0], inputs[selected][np.arange(len(positions)), positions], mask, dtype)
+                input_pos[selected] += 1
+            elif name == "PRT":
+                positions = output_pos[selected]
+                if positions.max() >= outputs.shape[1]:
+                    grown = np.full((rows, outputs.shape[1] * 2), np.nan)
+                    grown[:, :outputs.shape[1]] = outputs
+                    outputs = grown
+                selected_rows = np.arange(rows)[selected]
+                outputs[selected_rows, positions] = value(args[0], mask)
+                output_pos[selected] += 1
+            elif op == "ITOR":
+                assign(args[0], value(args[1], mask), mask, np.float64)
+            elif op == "RTOI":
+                assign(args[0], np.trunc(value(args[1], mask)), mask, np.int64)
+            elif name in self.REL_OPS:
+                assign(args[0], self.REL_OPS[name](value(args[1], mask), value(args[2], mask)), mask, np.int64)
+            elif name == "DIV":
+                divisor = value(args[2], mask)
+                if np.any(np.asarray(divisor) == 0):
+                    raise ZeroDivisionError("division by zero")
+                dividend = value(args[1], mask)
+                result = _int_div(dividend, divisor) if op == "IDIV" else np.true_divide(dividend, divisor)
+                assign(args[0], result, mask, dtype)
+            else:
+                assign(args[0], self.ARITH_OPS[name](value(args[1], mask), value(args[2], mask)), mask, dtype)
+
+        return outputs[:, :output_pos.max(initial=0)]
@@ -0,0 +1,467 @@
+import cpl_ast as ast
+from errors import BreakOutsideOfLoop, TypeMismatch, UnknownVariable
+from quad_translate import QuadTranslator
+
+
+class Label:
+    """Jump target, bound to a quad offset once the code at the target is generated"""
+    __slots__ = ("offset",)
+
+    def __init__(self):
+        self.offset = None
+
+
+class CodeGenerator:
+    """Walk a cpl_ast.Program and generate its quads.
+
+    Since the whole tree is known before any quad is generated, jumps refer to Label
+    objects that are resolved in one pass at the end, instead of the placeholder
+    strings CPLParser patches with backward scans.
+    Quads are numbered from 1, like in QuadTranslator.output().
+
+    With a pgo.Profile, the hot side of each if falls through and the cold one is
+    moved after the HALT, hot loops test their condition at the bottom so an iteration
+    takes a single jump,
+    and switch cases are tested from the most to the least frequent.
+    """
+
+    ARITH_OPS = {
+        "+": "ADD",
+        "-": "SUB",
+        "*": "MLT",
+        "/": "DIV",
+    }
+
+    # <= and >= are the negation of > and <
+    REL_OPS = {
+        "==": ("EQL", False),
+        "!=": ("NQL", False),
+        "<": ("LSS", False),
+        ">": ("GRT", False),
+        "<=": ("GRT", True),
+        ">=": ("LSS", True),
+    }
+
+    NEGATED_REL_OPS = {
+        "==": "!=",
+        "!=": "==",
+        "<": ">=",
+        ">": "<=",
+        "<=": ">",
+        ">=": "<",
+    }
+
+    def __init__(self, outfile="outfile.quad", profile=None):
+        self.outfile = outfile
+        self.profile = profile
+        # Program of the last generate(), see pgo.Profile.collect
+        self.program = None
+
+    def generate(self, program):
+        """Generate the quads of <program> and return a QuadTranslator holding them"""
+        self.reset(declared_types(program), program)
+        self.program = program
+        if self.profile is not None and not self.profile.matches(program):
+            print("Ignoring the profile, it was collected on another program")
+            self.branch_profile = None
+        self.stmt(program.body)
+        self.emit("HALT")
+        while self.deferred:
+            gen_cold, self.break_labels = self.deferred.pop(0)
+            gen_cold()
+
+        translator = QuadTranslator(self.outfile)
+        for quad in self.resolve():
+            translator.gen(self.render(quad))
+        return translator
+
+    def generate_stmt(self, node, types, base=0, next_tmp=0, break_label=None):
+        """Generate the statement <node> alone, as if its first quad was at offset <base> and
+        the previous statements used the temporaries up to t<next_tmp - 1>.
+        A break in <node> jumps to <break_label>. Doesn't support a profile.
+        Call resolve() to get the quads once all the labels are placed."""
+        self.reset(types, node, base, next_tmp)
+        if break_label is not None:
+            self.break_labels.append(break_label)
+        self.stmt(node)
+
+    def reset(self, types, root, base=0, next_tmp=0):
+        # The profile actually used, None when it doesn't match the program
+        self.branch_profile = self.profile
+        self.types = dict(types)
+        self.next_tmp = next_tmp
+        self.base = base
+        self.quads = []
+        self.break_labels = []
+        self.deferred = []
+        # (quad_start, quad_end, tmp_start, tmp_end) of each statement, in pre-order.
+        # Not meaningful with a profile, since cold code is moved away
+        self.spans = []
+        # Branch id -> offsets of the quads deciding where it goes, see pgo.Profile.collect
+        self.probes = {}
+        branches = (node for node in ast.walk(root) if isinstance(node, (ast.If, ast.While, ast.Switch)))
+        self.branch_ids = {id(node): branch_id for branch_id, node in enumerate(branches)}
+
+    def resolve(self):
+        """Return the quads with their Label arguments replaced by quad numbers"""
+        return [tuple(arg.offset + 1 if isinstance(arg, Label) else arg for arg in quad) for quad in self.quads]
+
+    # Helpers
+
+    @property
+    def offset(self):
+        return self.base + len(self.quads)
+
+    def emit(self, op, *args):
+        self.quads.append((op, *args))
+
+    def place(self, label):
+        label.offset = self.offset
+
+    @staticmethod
+    def render(quad):
+        return " ".join(str(arg) for arg in quad)
+
+    def defer(self, gen_cold):
+        """Generate the code of <gen_cold> after the HALT, out of the hot path"""
+        self.deferred.append((gen_cold, list(self.break_labels)))
+
+    def branch_counts(self, node, kind):
+        if self.branch_profile is None:
+            return None
+        return self.branch_profile.get(self.branch_ids[id(node)], kind)
+
+    def get_tmp_var(self, type):
+        varname = f"t{self.next_tmp}"
+        self.next_tmp += 1
+        self.types[varname] = type
+        return varname
+
+    def get_type(self, varname):
+        try:
+            return self.types[varname]
+        except KeyError:
+            raise UnknownVariable(varname)
+
+    @staticmethod
+    def prefix(type):
+        return "R" if type == "float" else "I"
+
+    def to_float(self, operand, type):
+        """Return <operand> converted to float, generating an ITOR if needed"""
+        if type == "float":
+            return operand
+        if not isinstance(operand, str):
+            return float(operand)
+
+        result_var = self.get_tmp_var("float")
+        self.emit("ITOR", result_var, operand)
+        return result_var
+
+    # Statements, the ones containing statements are generators yielding them in order
+
+    def stmt(self, node):
+        """Generate the statement <node>. The yielded sub-statements are generated from an explicit
+        stack of generators, since valid programs can nest deeper than the recursion limit"""
+        stack = [self.stmt_steps(node)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            else:
+                stack.append(self.stmt_steps(child))
+
+    def stmt_steps(self, node):
+        index = len(self.spans)
+        self.spans.append(None)
+        start, tmp_start = self.offset, self.next_tmp
+        steps = getattr(self, f"stmt_{type(node).__name__.lower()}")(node)
+        if steps is not None:
+            yield from steps
+        self.spans[index] = (start, self.offset, tmp_start, self.next_tmp)
+
+    def stmt_block(self, node):
+        yield from node.stmts
+
+    def stmt_assign(self, node):
+        var_type = self.get_type(node.name)
+        value, value_type = self.expr(node.expr)
+        if var_type != value_type:
+            if var_type == "int":
+                raise TypeMismatch(node.name)
+            value = self.to_float(value, value_type)
+
+        self.emit(f"{self.prefix(var_type)}ASN", node.name, value)
+
+    def stmt_input(self, node):
+        self.emit(f"{self.prefix(self.get_type(node.name))}INP", node.name)
+
+    def stmt_output(self, node):
+        value, value_type = self.expr(node.expr)
+        self.emit(f"{self.prefix(value_type)}PRT", value)
+
+    def stmt_if(self, node):
+        counts = self.branch_counts(node, "if")
+        if counts is None or counts["then"] == counts["else"]:
+            yield from self.plain_if(node)
+            return
+
+        if node.orelse is None and counts["else"] <= 2 * counts["then"]:
+            # Moved away, the then side takes a jump there and one back each time it runs,
+            # in place a single jump each time it's skipped
+            yield from self.plain_if(node)
+            return
+        yield from self.if_with_cold_side(node, counts["then"] > counts["else"])
+
+    def plain_if(self, node):
+        """
+        cond
+        JMPZ cond else
+        then
+        JUMP end        // only with an else block
+        else: orelse
+        end:
+        """
+        branch_id = self.branch_ids[id(node)]
+        else_label = Label()
+        cond, _ = self.expr(node.cond)
+        self.probes[branch_id] = ("if", [(self.offset, False)])
+        self.emit("JMPZ", cond, else_label)
+        yield node.then
+
+        if node.orelse is None:
+            self.place(else_label)
+            return
+
+        end_label = Label()
+        self.emit("JUMP", end_label)
+        self.place(else_label)
+        yield node.orelse
+        self.place(end_label)
+
+    def if_with_cold_side(self, node, then_is_hot):
+        """
+        cond                // negated if else is hot
+        JMPZ cond cold
+        hot
+        end:
+        ...
+        HALT
+        cold: cold
+        JUMP end
+        """
+        hot, cold = (node.then, node.orelse) if then_is_hot else (node.orelse, node.then)
+        branch_id = self.branch_ids[id(node)]
+        cold_label, end_label = Label(), Label()
+        cond = self.cond(node.cond, negate=not then_is_hot)
+        self.probes[branch_id] = ("if", [(self.offset, not then_is_hot)])
+        self.emit("JMPZ", cond, cold_label)
+        if hot is not None:
+            yield hot
+        self.place(end_label)
+
+        def gen_cold():
+            self.place(cold_label)
+            self.stmt(cold)
+            self.emit("JUMP", end_label)
+        self.defer(gen_cold)
+
+    def stmt_while(self, node):
+        """
+        start: cond
+        JMPZ cond end
+        body
+        JUMP start
+        end:
+        """
+        counts = self.branch_counts(node, "while")
+        if counts is not None and counts["iterations"] > counts["exits"]:
+            yield from self.rotated_while(node)
+            return
+
+        start_label, end_label = Label(), Label()
+        self.place(start_label)
+        cond, _ = self.expr(node.cond)
+        self.probes[self.branch_ids[id(node)]] = ("while", [(self.offset, False)])
+        self.emit("JMPZ", cond, end_label)
+
+        self.break_labels.append(end_label)
+        yield node.body
+        self.break_labels.pop()
+
+        self.emit("JUMP", start_label)
+        self.place(end_label)
+
+    def rotated_while(self, node):
+        """The condition is generated twice, so entering the loop doesn't take a jump either:
+        cond
+        JMPZ cond end
+        body: body
+        not cond
+        JMPZ not_cond body
+        end:
+        """
+        body_label, end_label = Label(), Label()
+        cond, _ = self.expr(node.cond)
+        guard_jump = self.offset
+        self.emit("JMPZ", cond, end_label)
+
+        self.place(body_label)
+        self.break_labels.append(end_label)
+        yield node.body
+        self.break_labels.pop()
+
+        not_cond = self.cond(node.cond, negate=True)
+        self.probes[self.branch_ids[id(node)]] = ("while", [(guard_jump, False), (self.offset, True)])
+        self.emit("JMPZ", not_cond, body_label)
+        self.place(end_label)
+
+    def stmt_switch(self, node):
+        """All the case tests come first, then the case bodies in source order so
+        a case without break falls through to the next one:
+        INQL t expr case_1
+        JMPZ t body_1
+        ...
+        JUMP default
+        body_1: ...
+        default: ...
+        end:
+        """
+        value, value_type = self.expr(node.expr)
+        end_label, default_label = Label(), Label()
+        body_labels = [Label() for _ in node.cases]
+
+        # Test the most frequent cases first, the case values are distinct so the order doesn't matter
+        test_order = list(range(len(node.cases)))
+        counts = self.branch_counts(node, "switch")
+        if counts is not None and len(counts["cases"]) == len(node.cases):
+            test_order.sort(key=lambda i: counts["cases"][i], reverse=True)
+
+        case_jumps = [None] * len(node.cases)
+        for i in test_order:
+            case_value = node.cases[i].value
+            if value_type == "float":
+                case_value = float(case_value)
+            test_var = self.get_tmp_var("int")
+            self.emit(f"{self.prefix(value_type)}NQL", test_var, value, case_value)
+            case_jumps[i] = self.offset
+            self.emit("JMPZ", test_var, body_labels[i])
+        self.probes[self.branch_ids[id(node)]] = ("switch", case_jumps, self.offset)
+        self.emit("JUMP", default_label)
+
+        self.break_labels.append(end_label)
+        for case, body_label in zip(node.cases, body_labels):
+            self.place(body_label)
+            yield from case.stmts
+        self.place(default_label)
+        yield from node.default
+        self.break_labels.pop()
+
+        self.place(end_label)
+
+    def stmt_break(self, node):
+        if not self.break_labels:
+            raise BreakOutsideOfLoop()
+        self.emit("JUMP", self.break_labels[-1])
+
+    # Expressions, each returns a (operand, type) tuple. The expr_* methods get the ones of
+    # the operands of their node
+
+    def expr(self, root):
+        """Generate the expression <root> in post-order. A sum of n terms is a tree n levels
+        deep, so the nodes wait on an explicit stack rather than in nested calls"""
+        # (operand, type) of the generated nodes, the operands of a node are the last ones
+        results = []
+        stack = [(root, False)]
+        while stack:
+            node, operands_done = stack.pop()
+            operands = [getattr(node, name) for name in node.__slots__ if isinstance(getattr(node, name), ast.Node)]
+            if operands and not operands_done:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in reversed(operands))
+                continue
+
+            first = len(results) - len(operands)
+            generated = results[first:]
+            del results[first:]
+            results.append(getattr(self, f"expr_{type(node).__name__.lower()}")(node, *generated))
+        return results[0]
+
+    def cond(self, node, negate=False):
+        """Generate a bool expression, or its negation, and return the variable holding it"""
+        if negate:
+            if isinstance(node, ast.RelOp):
+                node = ast.RelOp(self.NEGATED_REL_OPS[node.op], node.left, node.right)
+            elif isinstance(node, ast.Not):
+                node = node.expr
+            else:
+                node = ast.Not(node)
+
+        value, _ = self.expr(node)
+        return value
+
+    def expr_num(self, node):
+        return node.value, "float" if isinstance(node.value, float) else "int"
+
+    def expr_var(self, node):
+        return node.name, self.get_type(node.name)
+
+    def expr_cast(self, node, operand):
+        value, value_type = operand
+        if value_type == node.type:
+            return value, value_type
+
+        if node.type == "float":
+            return self.to_float(value, value_type), "float"
+
+        if not isinstance(value, str):
+            return int(value), "int"
+        result_var = self.get_tmp_var("int")
+        self.emit("RTOI", result_var, value)
+        return result_var, "int"
+
+    def binary_operands(self, left, right):
+        """Convert both operands to a common type"""
+        left, left_type = left
+        right, right_type = right
+        if left_type == right_type:
+            return left, right, left_type
+
+        return self.to_float(left, left_type), self.to_float(right, right_type), "float"
+
+    def expr_binop(self, node, left, right):
+        left, right, type = self.binary_operands(left, right)
+        result_var = self.get_tmp_var(type)
+        self.emit(f"{self.prefix(type)}{self.ARITH_OPS[node.op]}", result_var, left, right)
+        return result_var, type
+
+    def expr_relop(self, node, left, right):
+        left, right, type = self.binary_operands(left, right)
+        op, negate = self.REL_OPS[node.op]
+        result_var = self.get_tmp_var("int")
+        self.emit(f"{self.prefix(type)}{op}", result_var, left, right)
+        if negate:
+            self.emit("IEQL", result_var, result_var, 0)
+        return result_var, "int"
+
+    def expr_boolop(self, node, left, right):
+        """Bool values are 0/1 ints: a && b is a*b, a || b is a+b > 0"""
+        (left, _), (right, _) = left, right
+        result_var = self.get_tmp_var("int")
+        if node.op == "&&":
+            self.emit("IMLT", result_var, left, right)
+        else:
+            self.emit("IADD", result_var, left, right)
+            self.emit("IGRT", result_var, result_var, 0)
+        return result_var, "int"
+
+    def expr_not(self, node, operand):
+        value, _ = operand
+        result_var = self.get_tmp_var("int")
+        self.emit("IEQL", result_var, value, 0)
+        return result_var, "int"
+
+
+def declared_types(program):
+    """Map each declared variable of <program> to its type"""
+    return {name: declaration.type for declaration in program.declarations for name in declaration.names}
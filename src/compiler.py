@@ -1,16 +1,110 @@
 from lexer import CPLLexer
-from parser import CPLParser
+
+
+def compile_ast(text, simplify=True, profile=None):
+    """Two-phase compilation: parse <text> into an AST, then generate its quads.
+    Return the AST, the CodeGenerator and the QuadTranslator holding the quads"""
+    from ast_parser import CPLASTParser
+    from codegen import CodeGenerator
+    from simplify import Simplifier
+
+    program = CPLASTParser().parse(CPLLexer().tokenize(text))
+    if simplify:
+        simplifier = Simplifier()
+        program = simplifier.simplify(program)
+        print(f"Simplified expressions with {simplifier.rewrites} rewrites")
+    generator = CodeGenerator(profile=profile)
+    translator = generator.generate(program)
+    return program, generator, translator
+
+
+def instrument(generator, translator, inputs_file, profile_file):
+    """Run the compiled program once per line of <inputs_file> and save its profile"""
+    from interpreter import QuadInterpreter, operand
+    from pgo import Profile
+
+    interpreter = QuadInterpreter(translator.lines)
+    with open(inputs_file) as fp:
+        for line in fp:
+            if line.strip():
+                interpreter.run(operand(value) for value in line.split())
+
+    Profile.collect(generator, interpreter).save(profile_file)
+
+
+def run_batch(translator, inputs_file, outputs_file):
+    """Run the compiled program on every row of <inputs_file> at once and save the outputs"""
+    import numpy as np
+    from batch import BatchExecutor
+
+    inputs = np.loadtxt(inputs_file, ndmin=2)
+    outputs = BatchExecutor(translator.lines).run(inputs)
+    np.savetxt(outputs_file, outputs)
+    print(f"Wrote batch outputs in {outputs_file}")
+
+
+def watch(filename, simplify=True):
+    """Recompile <filename> incrementally every time it changes, until interrupted"""
+    import time
+    from errors import BaseExc
+    from incremental import IncrementalCompiler
+
+    compiler = IncrementalCompiler(simplify=simplify)
+    last_text = None
+    while True:
+        text = open(filename).read()
+        if text != last_text:
+            last_text = text
+            try:
+                compiler.compile(text).output()
+            except BaseExc as exc:
+                print(exc)
+        time.sleep(0.5)
 
 
 def compile():
-    import sys
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(prog="compile.py")
+    arg_parser.add_argument("file", help="CPL file to compile")
+    arg_parser.add_argument("--ast", action="store_true", help="parse into an AST, then generate the quads")
+    arg_parser.add_argument("--no-simplify", action="store_true", help="don't simplify expressions (with --ast)")
+    arg_parser.add_argument("--instrument", metavar="INPUTS",
+                            help="run the program on each line of INPUTS and write a profile (with --ast)")
+    arg_parser.add_argument("--profile", default="profile.json", help="profile file written by --instrument")
+    arg_parser.add_argument("--pgo", metavar="PROFILE", help="lay out the code using PROFILE (with --ast)")
+    arg_parser.add_argument("--batch", metavar="INPUTS",
+                            help="run the program on every line of INPUTS at once with NumPy (with --ast)")
+    arg_parser.add_argument("--batch-output", default="batch_output.txt", help="outputs file written by --batch")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="recompile incrementally each time the file changes (with --ast)")
+    args = arg_parser.parse_args()
+
+    if args.watch:
+        try:
+            watch(args.file, simplify=not args.no_simplify)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    text = open(args.file).read()
 
-    if len(sys.argv) != 2:
-        print("Usage: python compile.py <file.cpl>")
+    if args.ast or args.instrument or args.pgo or args.batch:
+        profile = None
+        if args.pgo:
+            from pgo import Profile
+            profile = Profile.load(args.pgo)
 
-    filename = sys.argv[1]
-    text = open(filename).read()
+        program, generator, translator = compile_ast(text, simplify=not args.no_simplify, profile=profile)
+        translator.output()
+        if args.instrument:
+            instrument(generator, translator, args.instrument, args.profile)
+        if args.batch:
+            run_batch(translator, args.batch, args.batch_output)
+        print(program)
+        return
 
+    from parser import CPLParser
     parser = CPLParser()
     lexer = CPLLexer()
     try:
@@ -0,0 +1,166 @@
+"""Scaling checks: compile generated CPL programs of growing size and make sure the
+compile work and memory grow linearly with the program size.
+
+The work is counted in executed Python lines rather than timed, so a check gives the same
+result on every run, however loaded the machine is.
+
+Run with `python complexity.py [ast|legacy]`, the exit status is 1 if a scenario grows
+super-linearly. test_complexity.py runs the same checks with pytest.
+"""
+import math
+import sys
+import tracemalloc
+
+from ast_parser import CPLASTParser
+from codegen import CodeGenerator
+from lexer import CPLLexer
+from simplify import Simplifier
+
+# A scenario fails if its cost grows faster than size ** MAX_EXPONENT[metric]. The memory
+# peak steps up by 10-20% when a list or dict grows, so it gets more room than the lines
+MAX_EXPONENT = {"lines": 1.1, "memory": 1.25}
+# Sizes spaced by sqrt(2), so the steps of list and dict resizing average out in the fit
+SIZES = tuple(2 ** (k / 2) for k in range(9))
+# The exponent is fitted on the largest sizes only, where the fixed cost of a compile is negligible
+FIT_POINTS = 5
+
+
+def gen_statements(n):
+    """n blocks of straight line statements"""
+    body = "\n".join(f"input(a); b = a * {i} + b; output(b);" for i in range(n))
+    return f"a, b: int;\n{{\n{body}\n}}"
+
+
+def gen_nesting(n):
+    """if and while statements nested n deep"""
+    opening = "".join(
+        f"while (a < {i % 10}) {{ a = a + 1; if (a == {i % 10}) {{ b = b + a; "
+        for i in range(n)
+    )
+    closing = "break; } } " * n
+    return f"a, b: int;\n{{\ninput(a);\n{opening}{closing}\noutput(b);\n}}"
+
+
+def gen_switch_cases(n):
+    """A switch with n cases"""
+    cases = "\n".join(f"case {i}: b = b + {i}; output(b); break;" for i in range(n))
+    return f"a, b: int;\n{{\ninput(a);\nswitch (a) {{\n{cases}\ndefault: b = 0;\n}}\n}}"
+
+
+def gen_switches(n):
+    """n switch statements one after the other"""
+    switch = "switch (a) { case 1: b = 1; break; case 2: b = 2; default: b = 3; }"
+    body = "\n".join(switch for _ in range(n))
+    return f"a, b: int;\n{{\ninput(a);\n{body}\n}}"
+
+
+def gen_expression(n):
+    """A single expression with n terms"""
+    terms = " + ".join(f"a * {i + 2}" if i % 2 else f"b - {i}" for i in range(n))
+    return f"a, b: int;\n{{\ninput(a);\nb = {terms};\noutput(b);\n}}"
+
+
+# Scenario name -> (program generator, base size multiplied by SIZES)
+SCENARIOS = {
+    "statements": (gen_statements, 100),
+    "nesting": (gen_nesting, 50),
+    "switch_cases": (gen_switch_cases, 50),
+    "switches": (gen_switches, 50),
+    "expression": (gen_expression, 100),
+}
+
+
+def compile_ast(text):
+    program = CPLASTParser().parse(CPLLexer().tokenize(text))
+    program = Simplifier().simplify(program)
+    return CodeGenerator().generate(program)
+
+
+def compile_legacy(text):
+    from parser import CPLParser
+
+    parser = CPLParser()
+    parser.parse(CPLLexer().tokenize(text))
+    return parser.translator
+
+
+PIPELINES = {
+    "ast": compile_ast,
+    "legacy": compile_legacy,
+}
+
+
+def measure_lines(compile_fn, texts):
+    """Number of Python lines executed while compiling each text. Loops running in C, like
+    list.pop(0), aren't counted, the memory check catches the ones copying data"""
+    counts = []
+    count = 0
+
+    def trace_line(frame, event, arg):
+        nonlocal count
+        if event == "line":
+            count += 1
+        return trace_line
+
+    for text in texts:
+        count = 0
+        sys.settrace(lambda frame, event, arg: trace_line)
+        try:
+            compile_fn(text)
+        finally:
+            sys.settrace(None)
+        counts.append(count)
+    return counts
+
+
+def measure_memory(compile_fn, texts):
+    """Peak of the memory allocated while compiling each text, in bytes"""
+    peaks = []
+    for text in texts:
+        tracemalloc.start()
+        try:
+            compile_fn(text)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peaks
+
+
+def growth_exponent(sizes, costs):
+    """Slope of the least squares fit of log(cost) = k * log(size) + c"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(cost) for cost in costs]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    return numerator / denominator
+
+
+def check_scaling(pipeline="ast", scenarios=None, max_exponent=MAX_EXPONENT, sizes=SIZES):
+    """Run the scenarios and return a list of (scenario, metric, exponent, passed)"""
+    compile_fn = PIPELINES[pipeline]
+    results = []
+    for name in scenarios or SCENARIOS:
+        gen_program, base_size = SCENARIOS[name]
+        scenario_sizes = [round(base_size * factor) for factor in sizes]
+        # The first text is the smallest program, its cost is the fixed cost of a compile
+        texts = [gen_program(1)] + [gen_program(size) for size in scenario_sizes]
+        # Warm up, so the first measure doesn't pay for imports and caches
+        compile_fn(texts[1])
+
+        for metric, measure in (("lines", measure_lines), ("memory", measure_memory)):
+            baseline, *costs = measure(compile_fn, texts)
+            costs = [max(cost - baseline, 1e-9) for cost in costs]
+            exponent = growth_exponent(scenario_sizes[-FIT_POINTS:], costs[-FIT_POINTS:])
+            results.append((name, metric, exponent, exponent <= max_exponent[metric]))
+    return results
+
+
+if __name__ == '__main__':
+    pipeline = sys.argv[1] if len(sys.argv) > 1 else "ast"
+    failed = False
+    for name, metric, exponent, passed in check_scaling(pipeline):
+        status = "ok" if passed else "SUPER-LINEAR"
+        print(f"{pipeline:8} {name:14} {metric:8} size^{exponent:.2f}  {status}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,218 @@
+"""Lightweight AST for CPL programs.
+
+Nodes only hold their children in __slots__, they carry no behaviour. The tree is
+built by CPLASTParser and walked by CodeGenerator, so it can be kept and
+re-used for several code generation runs.
+"""
+
+
+class Node:
+    __slots__ = ()
+
+    # Both use an explicit stack, like walk()
+
+    def __repr__(self):
+        parts = []
+        # (True, text to output) or (False, value to format)
+        stack = [(False, self)]
+        while stack:
+            is_text, item = stack.pop()
+            if is_text:
+                parts.append(item)
+            elif isinstance(item, Node):
+                pieces = [(True, f"{type(item).__name__}(")]
+                for i, name in enumerate(item.__slots__):
+                    pieces += [(True, f"{', ' if i else ''}{name}="), (False, getattr(item, name))]
+                pieces.append((True, ")"))
+                stack.extend(reversed(pieces))
+            elif isinstance(item, list):
+                pieces = [(True, "[")]
+                for i, element in enumerate(item):
+                    if i:
+                        pieces.append((True, ", "))
+                    pieces.append((False, element))
+                pieces.append((True, "]"))
+                stack.extend(reversed(pieces))
+            else:
+                parts.append(repr(item))
+        return "".join(parts)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        stack = [(self, other)]
+        while stack:
+            a, b = stack.pop()
+            if isinstance(a, (Node, list)):
+                if type(a) is not type(b) or (isinstance(a, list) and len(a) != len(b)):
+                    return False
+                if isinstance(a, list):
+                    stack.extend(zip(a, b))
+                else:
+                    stack.extend((getattr(a, name), getattr(b, name)) for name in a.__slots__)
+            elif a != b:
+                return False
+        return True
+
+    __hash__ = None
+
+
+# Program structure
+
+class Program(Node):
+    __slots__ = ("declarations", "body")
+
+    def __init__(self, declarations, body):
+        self.declarations = declarations
+        self.body = body
+
+
+class Declaration(Node):
+    __slots__ = ("names", "type")
+
+    def __init__(self, names, type):
+        self.names = names
+        self.type = type
+
+
+# Statements
+
+class Block(Node):
+    __slots__ = ("stmts",)
+
+    def __init__(self, stmts):
+        self.stmts = stmts
+
+
+class Assign(Node):
+    __slots__ = ("name", "expr")
+
+    def __init__(self, name, expr):
+        self.name = name
+        self.expr = expr
+
+
+class Input(Node):
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Output(Node):
+    __slots__ = ("expr",)
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class If(Node):
+    __slots__ = ("cond", "then", "orelse")
+
+    def __init__(self, cond, then, orelse=None):
+        self.cond = cond
+        self.then = then
+        self.orelse = orelse
+
+
+class While(Node):
+    __slots__ = ("cond", "body")
+
+    def __init__(self, cond, body):
+        self.cond = cond
+        self.body = body
+
+
+class Switch(Node):
+    __slots__ = ("expr", "cases", "default")
+
+    def __init__(self, expr, cases, default):
+        self.expr = expr
+        self.cases = cases
+        self.default = default
+
+
+class Case(Node):
+    __slots__ = ("value", "stmts")
+
+    def __init__(self, value, stmts):
+        self.value = value
+        self.stmts = stmts
+
+
+class Break(Node):
+    __slots__ = ()
+
+
+# Expressions
+
+class BinOp(Node):
+    """Arithmetic operation, op is one of + - * /"""
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class RelOp(Node):
+    """Comparison, op is one of == != < > <= >="""
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class BoolOp(Node):
+    """Logical operation, op is one of || &&"""
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class Not(Node):
+    __slots__ = ("expr",)
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class Cast(Node):
+    __slots__ = ("type", "expr")
+
+    def __init__(self, type, expr):
+        self.type = type
+        self.expr = expr
+
+
+class Var(Node):
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Num(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def walk(node):
+    """Yield <node> and all the nodes below it, in pre-order"""
+    # Explicit stack, nested "yield from" would cost the depth of the tree for every node
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, Node):
+            yield node
+            stack.extend(getattr(node, name) for name in reversed(node.__slots__))
@@ -11,3 +11,19 @@ class BreakOutsideOfLoop(BaseExc):
     def __init__(self):
         message = f"Break used outside of loop or switch"
         super().__init__(message)
+
+class TypeMismatch(BaseExc):
+    def __init__(self, varname):
+        message = f"Cannot assign a float value to int variable {varname}"
+        super().__init__(message)
+
+class CPLSyntaxError(BaseExc):
+    def __init__(self, message, lineno=None):
+        if lineno is not None:
+            message = f"Line {lineno}: {message}"
+        super().__init__(message)
+
+class StepLimitExceeded(BaseExc):
+    def __init__(self, max_steps):
+        message = f"Program did not halt after {max_steps} steps"
+        super().__init__(message)
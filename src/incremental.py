@@ -0,0 +1,432 @@
+import bisect
+
+from sly.lex import Token
+
+import cpl_ast as ast
+from ast_parser import CPLASTParser
+from codegen import CodeGenerator, Label, declared_types
+from errors import BaseExc, CPLSyntaxError
+from lexer import CPLLexer
+from quad_translate import QuadTranslator
+from simplify import Simplifier
+
+
+class StmtRecord:
+    """What the last compile produced for one statement.
+
+    container and key locate the statement in the AST: getattr(container, key[0]), indexed by
+    key[1] when the statement is in a list. parent is the record of the statement containing it.
+    src_* are offsets in the source text, quad_* offsets in the quads and tmp_* the numbers of
+    the temporaries it uses, all end-exclusive. In IncrementalCompiler.records from
+    IncrementalCompiler.gap on, they miss IncrementalCompiler.pending, see IncrementalCompiler.read().
+    """
+    __slots__ = ("node", "container", "key", "parent", "src_start", "src_end",
+                 "quad_start", "quad_end", "tmp_start", "tmp_end")
+
+    def __init__(self, node, container, key, parent, src_span, quad_span):
+        self.node = node
+        self.container = container
+        self.key = key
+        self.parent = parent
+        self.src_start, self.src_end = src_span
+        self.quad_start, self.quad_end, self.tmp_start, self.tmp_end = quad_span
+
+    def contains(self, start, end):
+        return self.src_start <= start and end <= self.src_end
+
+    def shift(self, src_delta, quad_delta, tmp_delta):
+        self.src_start += src_delta
+        self.src_end += src_delta
+        self.quad_start += quad_delta
+        self.quad_end += quad_delta
+        self.tmp_start += tmp_delta
+        self.tmp_end += tmp_delta
+
+
+class IncrementalCompiler:
+    """Two-phase compiler re-using its previous compile when the source is edited.
+
+    compile() finds the statements containing the edited text: the consecutive statements of a
+    block overlapping it, so adding or removing statements doesn't widen to the whole block, or
+    else the smallest statement containing it. It re-lexes and re-parses only them, generates
+    their quads and splices them in place of the old ones, moving the jump targets and
+    renumbering the temporaries after them. When the edit is not inside a block (declarations,
+    unbalanced braces...) it falls back to a full compile. The quads are always the same as the
+    ones of a full compile of the new text.
+    Profile guided layout is not supported, since it moves code away from its statement.
+    """
+
+    def __init__(self, simplify=True, outfile="outfile.quad"):
+        self.simplify = simplify
+        self.outfile = outfile
+        self.text = None
+        self.program = None
+        self.types = {}
+        # Statement records in pre-order, so sorted by src_start
+        self.records = []
+        # Like in a gap buffer, the records after the last edit are only shifted when a later edit
+        # reads them: self.records[self.gap:] miss the (src, quad, tmp) deltas of self.pending
+        self.gap = 0
+        self.pending = (0, 0, 0)
+        self.quads = []
+        self.lines = []
+        # Source span re-parsed by the last compile(), None after a full compile
+        self.last_region = None
+
+    def compile(self, text):
+        """Compile <text> and return a QuadTranslator holding its quads"""
+        if self.program is None or not self.recompile(text):
+            self.full_compile(text)
+            self.last_region = None
+
+        translator = QuadTranslator(self.outfile)
+        translator.lines.extend(self.lines)
+        return translator
+
+    def full_compile(self, text):
+        parser = CPLASTParser()
+        program = parser.parse(CPLLexer().tokenize(text))
+        types = declared_types(program)
+
+        quads, spans = self.generate(program.body, types, 0, 0, None)
+        quads.append(("HALT",))
+
+        self.text = text
+        self.program = program
+        self.types = types
+        self.records = list(self.build_records(parser, [(program.body, program, ("body", None))], None, spans))
+        self.gap, self.pending = len(self.records), (0, 0, 0)
+        self.quads = quads
+        self.lines = [CodeGenerator.render(quad) for quad in quads]
+
+    def generate(self, node, types, base, next_tmp, break_end):
+        """Generate the quads of the statement <node>, a break jumps to offset <break_end>
+        which is computed from the generated size. Return the quads and the statement spans"""
+        if self.simplify:
+            node = Simplifier().simplify_node(node, types)
+
+        generator = CodeGenerator()
+        break_label = Label() if break_end is not None else None
+        generator.generate_stmt(node, types, base, next_tmp, break_label)
+        if break_label is not None:
+            break_label.offset = break_end(len(generator.quads))
+        return generator.resolve(), generator.spans
+
+    @staticmethod
+    def build_records(parser, roots, parent, spans):
+        """Yield the StmtRecord of the (node, container, key) of <roots>, children of the record
+        <parent>, and of the statements below them, in the pre-order CodeGenerator generates them in"""
+        spans = iter(spans)
+        stack = [(node, container, key, parent) for node, container, key in reversed(roots)]
+        while stack:
+            node, container, key, parent = stack.pop()
+            record = StmtRecord(node, container, key, parent, parser.index_position(node), next(spans))
+            yield record
+
+            children = []
+            if isinstance(node, ast.Block):
+                children = [(stmt, node, ("stmts", i)) for i, stmt in enumerate(node.stmts)]
+            elif isinstance(node, ast.If):
+                children = [(node.then, node, ("then", None))]
+                if node.orelse is not None:
+                    children.append((node.orelse, node, ("orelse", None)))
+            elif isinstance(node, ast.While):
+                children = [(node.body, node, ("body", None))]
+            elif isinstance(node, ast.Switch):
+                for case in node.cases:
+                    children.extend((stmt, case, ("stmts", i)) for i, stmt in enumerate(case.stmts))
+                children.extend((stmt, node, ("default", i)) for i, stmt in enumerate(node.default))
+            stack.extend((child, container, key, record) for child, container, key in reversed(children))
+
+    # Records
+
+    def read(self, index):
+        """Return self.records[index], first applying the pending shift to it if needed"""
+        if index >= self.gap:
+            self.move_gap(index + 1)
+        return self.records[index]
+
+    def move_gap(self, index):
+        """Apply the pending shift to the records before <index> and only to them. The cost is
+        the distance to the last edit, which is small when editing around the same place"""
+        if any(self.pending):
+            low, high = sorted((self.gap, index))
+            sign = 1 if index > self.gap else -1
+            deltas = [sign * delta for delta in self.pending]
+            for record in self.records[low:high]:
+                record.shift(*deltas)
+        self.gap = index
+
+    def src_start(self, index):
+        record = self.records[index]
+        return record.src_start + self.pending[0] if index >= self.gap else record.src_start
+
+    def find(self, position):
+        """Index of the first record starting at <position> or after it"""
+        return bisect.bisect_left(range(len(self.records)), position, key=self.src_start)
+
+    def next_sibling(self, index):
+        """Index of the statement following the one of self.records[index] in the same
+        statement, None if it's the last one"""
+        record = self.read(index)
+        following = self.find(record.src_end)
+        if following < len(self.records) and self.read(following).parent is record.parent:
+            return following
+        return None
+
+    def subtree_size(self, index):
+        """Number of records of the statement of self.records[index] and the ones below it"""
+        return self.find(self.read(index).src_end) - index
+
+    # Recompilation
+
+    def recompile(self, text):
+        """Recompile only the statements containing the edit, return False if it can't be done"""
+        start, old_end, new_end = edited_region(self.text, text)
+        if start == old_end == new_end:
+            self.last_region = (start, start)
+            return True
+
+        # The innermost statement containing the edit is the last one starting before it or a parent
+        index = self.find(start + 1) - 1
+        if index < 0:
+            return False
+        record = self.read(index)
+        while record is not None and not record.contains(start, old_end):
+            record = record.parent
+
+        src_delta = new_end - old_end
+        while record is not None:
+            if self.recompile_children(text, record, start, old_end, src_delta):
+                return True
+            if self.recompile_block(text, record, src_delta):
+                return True
+            record = record.parent
+        return False
+
+    def recompile_children(self, text, record, start, old_end, src_delta):
+        """Re-parse the consecutive statements of the block or switch of <record> overlapping the
+        edit, or the smaller one next to it if none does"""
+        if not isinstance(record.node, (ast.Block, ast.Switch)) or start <= record.src_start:
+            return False
+
+        # From the last child starting before the edit, the ones starting in it
+        child = self.read(self.find(start) - 1)
+        while child is not record and child.parent is not record:
+            child = child.parent
+        index = self.find(record.src_start + 1) if child is record else self.find(child.src_start)
+        before, run = None, []
+        while index is not None and self.src_start(index) < old_end:
+            if self.read(index).src_end > start:
+                run.append(index)
+            else:
+                before = index
+            index = self.next_sibling(index)
+        if not run:
+            # Only the text between two statements changed
+            run = [min((i for i in (before, index) if i is not None), key=self.subtree_size)]
+        first, last = run[0], run[-1]
+
+        first_record, last_record = self.read(first), self.read(last)
+        container, (name, position) = first_record.container, first_record.key
+        if last_record.container is not container or last_record.key[0] != name:
+            return False
+        src_start = min(first_record.src_start, start)
+        src_end = max(last_record.src_end, old_end)
+        if isinstance(record.node, ast.Block):
+            inside = record.src_start < src_start and src_end < record.src_end
+        else:
+            # The text between the statements of a switch can hold case labels
+            inside = (src_start, src_end) == (first_record.src_start, last_record.src_end)
+        if not inside:
+            return False
+
+        nodes, parser = self.parse_stmts(text, src_start, src_end, src_delta)
+        replaced = last_record.key[1] - position + 1
+        if nodes is None or (not nodes and replaced == len(getattr(container, name))):
+            return False
+        roots = [(node, container, (name, position + i)) for i, node in enumerate(nodes)]
+        return self.replace(text, first, last, roots, parser, (src_start, src_end + src_delta), src_delta)
+
+    def recompile_block(self, text, record, src_delta):
+        """Re-parse the block of <record> when it's the body of the program, an if or a while"""
+        if record.key[1] is not None:
+            return False
+
+        src_start, src_end = record.src_start, record.src_end + src_delta
+        nodes, parser = self.parse_stmts(text, src_start, record.src_end, src_delta)
+        if nodes is None or len(nodes) != 1 or not isinstance(nodes[0], ast.Block):
+            return False
+        index = self.find(src_start)
+        return self.replace(text, index, index, [(nodes[0], record.container, record.key)], parser,
+                            (src_start, src_end), src_delta)
+
+    def parse_stmts(self, text, src_start, src_end, src_delta):
+        """Parse the statements replacing self.text[src_start:src_end] in <text>, return them
+        with their parser, or (None, None) if they don't parse alone"""
+        new_end = src_end + src_delta
+        for marker in ("/*", "*/"):
+            # A comment could extend outside of the statements
+            if self.text.find(marker, src_start, src_end) != -1 or text.find(marker, src_start, new_end) != -1:
+                return None, None
+
+        parser = CPLASTParser()
+        if not text[src_start:new_end].strip():
+            return [], parser
+        try:
+            program = parser.parse(stmt_tokens(text, src_start, new_end))
+        except BaseExc:
+            return None, None
+        if program is None:
+            return None, None
+        return program.body.stmts, parser
+
+    def replace(self, text, first, last, roots, parser, src_span, src_delta):
+        """Replace the statements of self.records[first] to self.records[last], consecutive
+        children of the same statement, by the (node, container, key) of <roots>"""
+        first_record, last_record = self.read(first), self.read(last)
+        parent = first_record.parent
+        end = self.find(last_record.src_end)
+        self.move_gap(end)
+
+        # A break jumps to the end of the innermost enclosing while or switch, which moves
+        # by the difference of size of the statements
+        quad_start, quad_end = first_record.quad_start, last_record.quad_end
+        tmp_end = last_record.tmp_end
+        outer = parent
+        while outer is not None and not isinstance(outer.node, (ast.While, ast.Switch)):
+            outer = outer.parent
+        break_end = None
+        if outer is not None:
+            break_end = lambda size, end=outer.quad_end: end + size - (quad_end - quad_start)
+        try:
+            quads, spans = self.generate(ast.Block([node for node, *_ in roots]), self.types,
+                                         quad_start, first_record.tmp_start, break_end)
+        except BaseExc:
+            return False
+
+        quad_delta = len(quads) - (quad_end - quad_start)
+        tmp_delta = spans[0][3] - tmp_end
+        self.splice_quads(parent, quads, quad_start, quad_end, quad_delta, tmp_end, tmp_delta)
+
+        # Records, the first span is the one of the block wrapping the statements
+        new_records = list(self.build_records(parser, roots, parent, spans[1:]))
+        self.records[first:end] = new_records
+        self.gap = first + len(new_records)
+        self.pending = tuple(map(sum, zip(self.pending, (src_delta, quad_delta, tmp_delta))))
+        outer = parent
+        while outer is not None:
+            outer.src_end += src_delta
+            outer.quad_end += quad_delta
+            outer.tmp_end += tmp_delta
+            outer = outer.parent
+
+        # AST
+        container, (name, position) = first_record.container, first_record.key
+        if position is None:
+            setattr(container, name, roots[0][0])
+        else:
+            replaced = last_record.key[1] - position + 1
+            getattr(container, name)[position:position + replaced] = [node for node, *_ in roots]
+            if len(roots) != replaced:
+                self.renumber_siblings(parent, container, len(roots) - replaced)
+
+        self.text = text
+        self.last_region = src_span
+        return True
+
+    def splice_quads(self, parent, quads, quad_start, quad_end, quad_delta, tmp_end, tmp_delta):
+        """Replace the quads from <quad_start> to <quad_end> by <quads>, moving the jump targets
+        after them and renumbering the temporaries after them"""
+        new_end = quad_start + len(quads)
+        self.quads[quad_start:quad_end] = quads
+        self.lines[quad_start:quad_end] = [CodeGenerator.render(quad) for quad in quads]
+        if not quad_delta and not tmp_delta:
+            return
+
+        # The jumps before the new quads going past them are in the top level statement containing them
+        before = range(0)
+        if parent is not None and parent.parent is not None:
+            top = parent
+            while top.parent.parent is not None:
+                top = top.parent
+            before = range(top.quad_start, quad_start)
+        for i in [*before, *range(new_end, len(self.quads))]:
+            quad = self.quads[i]
+            relocated = self.relocate(quad, quad_end, quad_delta, tmp_end if i >= new_end else None, tmp_delta)
+            if relocated is not quad:
+                self.quads[i] = relocated
+                self.lines[i] = CodeGenerator.render(relocated)
+
+    def renumber_siblings(self, parent, container, delta):
+        """Move by <delta> the keys of the children of <parent> in <container> after the new records"""
+        index = self.gap
+        while index < len(self.records) and self.src_start(index) < parent.src_end:
+            record = self.records[index]
+            if record.parent is parent and record.container is container:
+                record.key = (record.key[0], record.key[1] + delta)
+            index += 1
+
+    def relocate(self, quad, quad_end, quad_delta, tmp_end, tmp_delta):
+        """Return <quad> with its jump target moved if it was after the spliced quads, and
+        its temporaries renumbered if <tmp_end> is given. Return <quad> itself if unchanged"""
+        op, *args = quad
+        if tmp_end is not None and tmp_delta:
+            args = [self.renumber(arg, tmp_end, tmp_delta) for arg in args]
+        if op in ("JUMP", "JMPZ") and quad_delta and args[-1] - 1 >= quad_end:
+            args[-1] += quad_delta
+
+        relocated = (op, *args)
+        return quad if relocated == quad else relocated
+
+    def renumber(self, arg, tmp_end, tmp_delta):
+        if isinstance(arg, str) and arg[0] == "t" and arg[1:].isdigit() and arg not in self.types:
+            number = int(arg[1:])
+            if number >= tmp_end:
+                return f"t{number + tmp_delta}"
+        return arg
+
+
+def stmt_tokens(text, start, end):
+    """Tokens of text[start:end] wrapped in braces, so it parses as a program without declarations.
+    Their line numbers only serve the errors, and an error makes compile() do a full compile"""
+    yield brace("{", start)
+    lexer = CPLLexer()
+    for tok in lexer.tokenize(text, index=start):
+        if tok.index >= end:
+            break
+        if tok.end > end:
+            raise CPLSyntaxError("Token runs out of the statement", tok.lineno)
+        yield tok
+    yield brace("}", end)
+
+
+def brace(value, index):
+    tok = Token()
+    tok.type = tok.value = value
+    tok.lineno = 0
+    tok.index = tok.end = index
+    return tok
+
+
+def edited_region(old, new):
+    """Return (start, old_end, new_end) such that old[start:old_end] was replaced by new[start:new_end]"""
+    limit = min(len(old), len(new))
+    start = common_length(limit, lambda low, high: old[low:high] == new[low:high])
+    suffix = common_length(limit - start, lambda low, high:
+                           old[len(old) - high:len(old) - low] == new[len(new) - high:len(new) - low])
+    return start, len(old) - suffix, len(new) - suffix
+
+
+def common_length(limit, equal):
+    """Largest n <= limit such that equal(0, n), by bisection. equal(low, high) is only called
+    once the parts before low are known equal, so it only compares from low to high, which adds
+    up to less than 2 * limit characters"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if equal(low, middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
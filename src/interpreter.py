@@ -0,0 +1,117 @@
+import operator
+
+from errors import StepLimitExceeded
+
+
+def _div(a, b):
+    return a / b
+
+
+def _int_div(a, b):
+    """Integer division truncating toward zero"""
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+class QuadInterpreter:
+    """Execute quads, as generated by QuadTranslator, and count how often each quad runs.
+
+    quad_counts[i] is the number of executions of quad i (0 based), taken_counts[i]
+    the number of times the jump at quad i was taken. Counts add up over run() calls.
+    """
+
+    ARITH_OPS = {
+        "ADD": operator.add,
+        "SUB": operator.sub,
+        "MLT": operator.mul,
+        "DIV": _div,
+    }
+
+    REL_OPS = {
+        "EQL": operator.eq,
+        "NQL": operator.ne,
+        "LSS": operator.lt,
+        "GRT": operator.gt,
+    }
+
+    def __init__(self, lines, max_steps=10_000_000):
+        self.code = [self.decode(line) for line in lines]
+        self.max_steps = max_steps
+        self.quad_counts = [0] * len(self.code)
+        self.taken_counts = [0] * len(self.code)
+
+    @staticmethod
+    def decode(line):
+        op, *args = line.split()
+        return op, [operand(arg) for arg in args]
+
+    def run(self, inputs):
+        """Run the program reading its input() values from <inputs>, return the output() values"""
+        inputs = iter(inputs)
+        inputs_read = 0
+        env = {}
+        outputs = []
+
+        def value(arg):
+            return env.get(arg, 0) if isinstance(arg, str) else arg
+
+        pc = 0
+        steps = 0
+        while pc < len(self.code):
+            steps += 1
+            if steps > self.max_steps:
+                raise StepLimitExceeded(self.max_steps)
+
+            self.quad_counts[pc] += 1
+            op, args = self.code[pc]
+            pc += 1
+
+            if op == "HALT":
+                break
+            if op in ("JUMP", "JMP"):
+                self.taken_counts[pc - 1] += 1
+                pc = args[0] - 1
+                continue
+            if op == "JMPZ":
+                if value(args[0]) == 0:
+                    self.taken_counts[pc - 1] += 1
+                    pc = args[1] - 1
+                continue
+
+            cast = float if op[0] == "R" else int
+            name = op[1:]
+            if name == "ASN":
+                env[args[0]] = cast(value(args[1]))
+            elif name == "INP":
+                try:
+                    env[args[0]] = cast(next(inputs))
+                except StopIteration:
+                    raise EOFError(f"Not enough inputs: quad {pc} reads input {inputs_read + 1}") from None
+                inputs_read += 1
+            elif name == "PRT":
+                # A variable never assigned reads as the int 0, even a float one
+                outputs.append(cast(value(args[0])))
+            elif op == "ITOR":
+                env[args[0]] = float(value(args[1]))
+            elif op == "RTOI":
+                env[args[0]] = int(value(args[1]))
+            elif name in self.REL_OPS:
+                env[args[0]] = int(self.REL_OPS[name](value(args[1]), value(args[2])))
+            elif op == "IDIV":
+                env[args[0]] = _int_div(value(args[1]), value(args[2]))
+            else:
+                env[args[0]] = cast(self.ARITH_OPS[name](value(args[1]), value(args[2])))
+
+        return outputs
+
+
+def operand(arg):
+    """Convert a quad argument to a number if it is a literal, keep it as a name otherwise"""
+    try:
+        return int(arg)
+    except ValueError:
+        pass
+    try:
+        return float(arg)
+    except ValueError:
+        return arg
@@ -108,7 +108,7 @@ class CPLLexer(Lexer):
     NOT = "!"
 
     ID = rf"[a-zA-Z][a-zA-Z0-9]*"
-    NUM = rf"[0-9]+(?:.[0-9]+)?"
+    NUM = rf"[0-9]+(?:\.[0-9]+)?"
 
     literals = {'(', ')', '{', '}', ',', ':', ';', '='}
 
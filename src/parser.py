@@ -162,16 +162,18 @@ class CPLParser(Parser):
 
     @_('SWITCH "(" expression ")" "{" caselist DEFAULT ":" stmtlist "}"')
     def switch_stmt(self, p):
-        self.translator.replace_all_switchvars(p.expression)
+        switch_start = self.translator.end_switch()
+        self.translator.replace_all_switchvars(p.expression, switch_start)
         # Last switchcase is default, therefore delete it and the nextcase line
         self.translator.delete_last_next_and_switch_case()
-        self.translator.replace_all_breaks(f"JUMP {self.translator.offset}")
+        self.translator.replace_all_breaks(f"JUMP {self.translator.offset}", switch_start)
         return p
 
     @_('caselist CASE NUM ":" stmtlist', '')
     def caselist(self, p):
         if not hasattr(p, "CASE"):
             # Check if swiwtch_Var == switch_case --> jump to the next case
+            self.translator.begin_switch()
             tmp_var = self.vars_mgr.get_tmp_var('int')
             self.translator.gen(f"IEQL {tmp_var} %SWITCHVAR% %SWITCHCASE%")
             self.translator.gen(f"JMPZ {tmp_var} %NEXTCASE%")
@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+
+def program_hash(program):
+    """Hash of the cpl_ast tree <program>"""
+    return hashlib.sha256(repr(program).encode()).hexdigest()
+
+
+class Profile:
+    """Execution counts of a compiled program, used for profile guided code generation.
+
+    branches maps the id CodeGenerator gives to each if/while/switch (its pre-order
+    index in the AST) to counts that don't depend on how the code was laid out:
+    - if: {"kind": "if", "then": n, "else": n}
+    - while: {"kind": "while", "iterations": n, "exits": n}
+    - switch: {"kind": "switch", "cases": [n, ...], "default": n}
+    quad_counts and taken_counts are the raw per-quad counts of the instrumented run.
+    program is the program_hash() of the profiled program: the branch ids of an edited
+    program may point to other branches of the same kind, so its profile doesn't apply.
+    """
+
+    def __init__(self, branches=None, quad_counts=None, taken_counts=None, program=None):
+        self.branches = branches or {}
+        self.quad_counts = quad_counts or []
+        self.taken_counts = taken_counts or []
+        self.program = program
+
+    @classmethod
+    def collect(cls, generator, interpreter):
+        """Build the profile of the code generated by <generator> and executed by <interpreter>"""
+        quad_counts, taken_counts = interpreter.quad_counts, interpreter.taken_counts
+
+        def taken(off):
+            return taken_counts[off]
+
+        def not_taken(off):
+            return quad_counts[off] - taken_counts[off]
+
+        branches = {}
+        for branch_id, probe in generator.probes.items():
+            kind = probe[0]
+            if kind == "switch":
+                _, case_jumps, default_jump = probe
+                branches[branch_id] = {
+                    "kind": kind,
+                    "cases": [taken(off) for off in case_jumps],
+                    "default": taken(default_jump),
+                }
+                continue
+
+            # The JMPZs of an if or a while are taken when the condition is false, unless it was negated
+            _, jumps = probe
+            true_count = sum(taken(jump) if negated else not_taken(jump) for jump, negated in jumps)
+            false_count = sum(not_taken(jump) if negated else taken(jump) for jump, negated in jumps)
+            if kind == "if":
+                branches[branch_id] = {"kind": kind, "then": true_count, "else": false_count}
+            else:
+                branches[branch_id] = {"kind": kind, "iterations": true_count, "exits": false_count}
+
+        return cls(branches, list(quad_counts), list(taken_counts), program_hash(generator.program))
+
+    def matches(self, program):
+        """Whether this is a profile of the cpl_ast tree <program>"""
+        return self.program == program_hash(program)
+
+    def get(self, branch_id, kind):
+        """Counts of the branch <branch_id>, None if unknown or of another kind (stale profile)"""
+        counts = self.branches.get(branch_id)
+        if counts is None or counts["kind"] != kind:
+            return None
+        return counts
+
+    @classmethod
+    def load(cls, file):
+        with open(file) as fp:
+            data = json.load(fp)
+        branches = {int(branch_id): counts for branch_id, counts in data["branches"].items()}
+        return cls(branches, data["quad_counts"], data["taken_counts"], data.get("program"))
+
+    def save(self, file):
+        data = {
+            "branches": self.branches,
+            "quad_counts": self.quad_counts,
+            "taken_counts": self.taken_counts,
+            "program": self.program,
+        }
+        with open(file, 'w') as fp:
+            json.dump(data, fp)
+
+        print(f"Wrote profile in {file}")
@@ -1,11 +1,28 @@
+from bisect import bisect_left
+
 from errors import BreakOutsideOfLoop
 
 
 class QuadTranslator:
 
+    MULADD_OPS = {
+        "*": "IMLT",
+        "/": "IDIV",
+        "+": "IADD",
+        "-": "ISUB"
+    }
+
+    # Placeholders replaced once the offset or value they stand for is known
+    TAGS = ("%ENDBLOCK%", "%BREAK%", "%NEXTCASE%", "%SWITCHVAR%", "%SWITCHCASE%", "%END%")
+
     def __init__(self, outfile="outfile.quad"):
         self._output_lines = []
         self.outfile = outfile
+        # Offsets of the first line of the switches being parsed, innermost last
+        self._switch_starts = []
+        # Tag -> ascending offsets of the lines containing it, so finding the last one
+        # doesn't scan back through the code
+        self._tag_offsets = {tag: [] for tag in self.TAGS}
 
     def output(self, with_index=True, file=None):
         file = file or self.outfile
@@ -17,59 +34,71 @@ class QuadTranslator:
 
         print(f"Wrote output in {self.outfile}")
 
+    @property
+    def lines(self):
+        return self._output_lines
+
     @property
     def offset(self):
         return len(self._output_lines)
 
     def gen(self, data):
+        if "%" in data:
+            for tag, offsets in self._tag_offsets.items():
+                if tag in data:
+                    offsets.append(self.offset)
         self._output_lines.append(data)
 
+    def set_line(self, off, line):
+        """Replace the line at offset <off> by <line>"""
+        old_line = self._output_lines[off]
+        self._output_lines[off] = line
+        if "%" in old_line:
+            for tag, offsets in self._tag_offsets.items():
+                if tag in old_line and tag not in line:
+                    del offsets[bisect_left(offsets, off)]
+
+    def pop_line(self, off):
+        """Delete the line at offset <off>, the following lines move back by one"""
+        line = self._output_lines.pop(off)
+        for tag, offsets in self._tag_offsets.items():
+            index = bisect_left(offsets, off)
+            if tag in line:
+                del offsets[index]
+            for i in range(index, len(offsets)):
+                offsets[i] -= 1
+
+    def last_tag(self, tag):
+        """Offset of the last line containing <tag>, None if there is none. The first line
+        is never returned, it wasn't by the backward scans this replaces either"""
+        offsets = self._tag_offsets[tag]
+        if offsets and offsets[-1] > 0:
+            return offsets[-1]
+        return None
+
     @property
     def last_endblock_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if self._output_lines[i] == "%ENDBLOCK%":
-                return i
-
-        return None
+        return self.last_tag("%ENDBLOCK%")
 
     @property
     def last_break_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if self._output_lines[i] == "%BREAK%":
-                return i
-
-        return None
+        return self.last_tag("%BREAK%")
 
     @property
     def last_nextcase_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if "%NEXTCASE%" in self._output_lines[i]:
-                return i
-
-        return None
+        return self.last_tag("%NEXTCASE%")
 
     @property
     def last_switchvar_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if "%SWITCHVAR%" in self._output_lines[i]:
-                return i
-
-        return None
+        return self.last_tag("%SWITCHVAR%")
 
     @property
     def last_switchcase_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if "%SWITCHCASE%" in self._output_lines[i]:
-                return i
+        return self.last_tag("%SWITCHCASE%")
 
-        return None
     @property
     def last_end_tag(self):
-        for i in range(self.offset-1, 0, -1):
-            if "%END%" in self._output_lines[i]:
-                return i
-
-        return None
+        return self.last_tag("%END%")
 
 
     def and_(self, res_var, var1, var2):
@@ -153,13 +182,7 @@ class QuadTranslator:
         return
 
     def muladd_op(self, op, res_var, var1, var2):
-        self.map = {
-            "*": "IMLT",
-            "/": "IDIV",
-            "+": "IADD",
-            "-": "ISUB"
-        }
-        op_name = self.map.get(op)
+        op_name = self.MULADD_OPS.get(op)
         if not op_name:
             raise # UnknownOperation(f"No such operation {op}")
 
@@ -167,18 +190,19 @@ class QuadTranslator:
 
     def backref_offset(self, off):
         """Update the last %END% tag with the next offset"""
-        if not self.last_end_tag:
+        end_off = self.last_end_tag
+        if not end_off:
             raise SyntaxError
 
-        self._output_lines[self.last_end_tag] = self._output_lines[self.last_end_tag].replace("%END%", str(off))
+        self.set_line(end_off, self._output_lines[end_off].replace("%END%", str(off)))
 
     def remove_last_line(self):
-        self._output_lines.pop(-1)
+        self.pop_line(self.offset - 1)
 
     def replace_last_endblock(self, line):
         """Replace the last %ENDBLOCK% by another line and return its offset"""
         curr_off = self.last_endblock_tag
-        self._output_lines[curr_off] = line
+        self.set_line(curr_off, line)
 
         return curr_off
 
@@ -188,7 +212,7 @@ class QuadTranslator:
         if not curr_off:
             # No break, ignoring
             return
-        self._output_lines[curr_off] = line
+        self.set_line(curr_off, line)
         return curr_off
 
     def replace_last_nextcase(self, val):
@@ -197,7 +221,7 @@ class QuadTranslator:
         if not off:
             return  # Ignore
 
-        self._output_lines[off] = self._output_lines[off].replace("%NEXTCASE%", str(val))
+        self.set_line(off, self._output_lines[off].replace("%NEXTCASE%", str(val)))
 
     def replace_last_switchcase(self, val):
         """Replace the last occurence of %SWITCHCASE% by val and return offset"""
@@ -205,24 +229,28 @@ class QuadTranslator:
         if not off:
             return  # ignore
 
-        self._output_lines[off] = self._output_lines[off].replace("%SWITCHCASE%", str(val))
+        self.set_line(off, self._output_lines[off].replace("%SWITCHCASE%", str(val)))
         return off
 
-    def replace_all_switchvars(self, val):
-        """Replace all the preceding occurences of %SWITCHCASE% by val"""
-        off = self.last_switchvar_tag
+    def begin_switch(self):
+        """Mark the current offset as the start of a switch"""
+        self._switch_starts.append(self.offset)
 
-        while off is not None:
-            self._output_lines[off] = self._output_lines[off].replace("%SWITCHVAR%", str(val))
-            off = self.last_switchvar_tag
+    def end_switch(self):
+        """Return the start offset of the innermost switch and forget it"""
+        return self._switch_starts.pop()
 
-    def replace_all_breaks(self, line):
-        """Replace all the preceding lines with %BREAK% by <line>"""
-        off = self.last_break_tag
+    def replace_all_switchvars(self, val, start):
+        """Replace all the occurences of %SWITCHVAR% from offset <start> by val"""
+        offsets = self._tag_offsets["%SWITCHVAR%"]
+        for i in reversed(offsets[bisect_left(offsets, start):]):
+            self.set_line(i, self._output_lines[i].replace("%SWITCHVAR%", str(val)))
 
-        while off is not None:
-            self._output_lines[off] = line
-            off = self.last_break_tag
+    def replace_all_breaks(self, line, start):
+        """Replace all the lines with %BREAK% from offset <start> by <line>"""
+        offsets = self._tag_offsets["%BREAK%"]
+        for i in reversed(offsets[bisect_left(offsets, start):]):
+            self.set_line(i, line)
 
     def on_finish_check(self):
         for line in self._output_lines:
@@ -230,6 +258,6 @@ class QuadTranslator:
                 raise BreakOutsideOfLoop()
 
     def delete_last_next_and_switch_case(self):
-        self._output_lines.pop(self.last_nextcase_tag)
-        self._output_lines.pop(self.last_switchcase_tag)
+        self.pop_line(self.last_nextcase_tag)
+        self.pop_line(self.last_switchcase_tag)
 
@@ -0,0 +1,105 @@
+"""Random CPL programs, for the differential tests of the compilers and executors.
+
+The programs always terminate: each while counts a dedicated counter up to an input
+value clamped to 0..MAX_TRIPS, so rows of different inputs take different paths.
+Divisions are by non-zero constants only and the values stay far from the int64 limits.
+"""
+import random
+
+INT_VARS = ("a", "b", "c")
+FLOAT_VARS = ("x", "y")
+# Inputs, read first in this order
+INPUTS = ("a", "b", "x")
+MAX_TRIPS = 4
+
+
+class ProgramGenerator:
+    def __init__(self, seed, max_depth=3, max_stmts=4):
+        self.rng = random.Random(seed)
+        self.max_depth = max_depth
+        self.max_stmts = max_stmts
+
+    def program(self):
+        counters = [f"n{i}" for i in range(self.max_depth)]
+        body = [f"input({name});" for name in INPUTS]
+        body += self.stmts(0, in_loop=False)
+        return (f"{', '.join(INT_VARS + tuple(counters))}: int;\n"
+                f"{', '.join(FLOAT_VARS)}: float;\n"
+                "{\n" + "\n".join(body) + "\n}\n")
+
+    def stmts(self, depth, in_loop):
+        return [self.stmt(depth, in_loop) for _ in range(self.rng.randint(1, self.max_stmts))]
+
+    def block(self, depth, in_loop):
+        return "{ " + " ".join(self.stmts(depth + 1, in_loop)) + " }"
+
+    def stmt(self, depth, in_loop):
+        kinds = ["assign", "assign", "output"]
+        if depth < self.max_depth:
+            kinds += ["if", "while", "switch"]
+        if in_loop:
+            kinds.append("break")
+        kind = self.rng.choice(kinds)
+
+        if kind == "assign":
+            if self.rng.random() < 0.5:
+                return f"{self.rng.choice(INT_VARS)} = {self.int_expr(2)};"
+            return f"{self.rng.choice(FLOAT_VARS)} = {self.expr(2)};"
+        if kind == "output":
+            return f"output({self.expr(2)});"
+        if kind == "break":
+            return "break;"
+        if kind == "if":
+            text = f"if ({self.cond()}) {self.block(depth, in_loop)}"
+            if self.rng.random() < 0.5:
+                text += f" else {self.block(depth, in_loop)}"
+            return text
+        if kind == "while":
+            counter = f"n{depth}"
+            bound = self.rng.choice(("a", "b"))
+            return (f"{counter} = 0; while ({counter} < {bound} && {counter} < {MAX_TRIPS}) "
+                    f"{{ {counter} = {counter} + 1; {' '.join(self.stmts(depth + 1, True))} }}")
+
+        values = self.rng.sample(range(5), self.rng.randint(1, 4))
+        cases = " ".join(f"case {value}: {' '.join(self.stmts(depth + 1, True))}" for value in values)
+        return f"switch ({self.rng.choice(('a', 'b', 'a - b'))}) {{ {cases} default: {' '.join(self.stmts(depth + 1, True))} }}"
+
+    def int_expr(self, depth):
+        if depth == 0 or self.rng.random() < 0.3:
+            return self.rng.choice(INT_VARS + (str(self.rng.randint(0, 9)),))
+        op = self.rng.choice("+-*/")
+        if op in "*/":
+            return f"{self.int_expr(depth - 1)} {op} {self.rng.choice((1, 2, 3))}"
+        return f"{self.int_expr(depth - 1)} {op} {self.int_expr(depth - 1)}"
+
+    def expr(self, depth):
+        if depth == 0 or self.rng.random() < 0.3:
+            return self.rng.choice(INT_VARS + FLOAT_VARS + (str(self.rng.randint(0, 9)), "0.5", "2.0"))
+        op = self.rng.choice("+-*/")
+        if op in "*/":
+            return f"{self.expr(depth - 1)} {op} {self.rng.choice(('1', '2', '4', '0.5', '3'))}"
+        if self.rng.random() < 0.2:
+            return f"static_cast<int>({self.expr(depth - 1)}) {op} {self.int_expr(depth - 1)}"
+        return f"{self.expr(depth - 1)} {op} {self.expr(depth - 1)}"
+
+    def cond(self):
+        # No <= and >=, the lexer reads them as < or > followed by =
+        op = self.rng.choice(("==", "!=", "<", ">"))
+        text = f"{self.expr(1)} {op} {self.expr(1)}"
+        if self.rng.random() < 0.3:
+            text = f"{text} {self.rng.choice(('&&', '||'))} {self.int_expr(1)} < {self.rng.randint(0, 5)}"
+        if self.rng.random() < 0.2:
+            text = f"!({text})"
+        return text
+
+
+def random_program(seed, max_depth=3, max_stmts=4):
+    """Text of a random CPL program, the same for the same arguments"""
+    return ProgramGenerator(seed, max_depth, max_stmts).program()
+
+
+def random_inputs(seed, rows):
+    """<rows> input rows for random_program(), one value per name of INPUTS"""
+    rng = random.Random(seed)
+    return [[rng.randint(-1, MAX_TRIPS + 1), rng.randint(-1, MAX_TRIPS + 1), rng.choice((-1.5, 0.0, 0.25, 3.0))]
+            for _ in range(rows)]
@@ -0,0 +1,163 @@
+import math
+
+import cpl_ast as ast
+from codegen import declared_types
+
+
+class Simplifier:
+    """Algebraic simplification of the arithmetic expressions of a cpl_ast tree.
+
+    Returns a new tree, the given one is left untouched so it can be re-used.
+    The number of rewrites applied by the last simplify() is kept in self.rewrites.
+
+    Rewrites, x being any expression and c a number:
+    - c1 op c2 is folded to a single number
+    - c + x and c * x are canonicalised to x + c and x * c
+    - x + 0, x - 0, x * 1 and x / 1 become x
+    - x * 0 and x - x become 0 (int only, a float may be inf or nan)
+    - (x + c1) + c2 and (x * c1) * c2 become x + c3 and x * c3 (int only)
+    - x * 2 becomes x + x when x is a variable
+    - x / 2^k becomes x * 2^-k for floats, which is exact
+    """
+
+    def __init__(self):
+        self.rewrites = 0
+        self.types = {}
+        self.binop_types = {}
+
+    def simplify(self, program):
+        self.rewrites = 0
+        return self.simplify_node(program, declared_types(program))
+
+    def simplify_node(self, node, types):
+        """Simplify the sub-tree <node>, <types> maps the variables to their type"""
+        self.types = types
+        # id(node) -> (node, type), the node is kept so its id can't be re-used by another one
+        self.binop_types = {}
+        node = self.visit(node)
+        self.binop_types = {}
+        return node
+
+    def visit(self, root):
+        """Return a copy of <root> with its operations simplified, built in post-order from an
+        explicit stack like CodeGenerator.expr()"""
+        # Copies of the visited values, the children of a node are the last ones when it's built
+        results = []
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not isinstance(node, (list, ast.Node)):
+                results.append(node)
+                continue
+
+            children = node if isinstance(node, list) else [getattr(node, name) for name in node.__slots__]
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+
+            first = len(results) - len(children)
+            values = results[first:]
+            del results[first:]
+            if isinstance(node, list):
+                results.append(values)
+                continue
+
+            new_node = object.__new__(type(node))
+            for name, value in zip(node.__slots__, values):
+                setattr(new_node, name, value)
+            if isinstance(new_node, ast.BinOp):
+                new_node = self.binop(new_node)
+                # Typed while its operands are, so type_of() never has to recurse down the tree
+                self.type_of(new_node)
+            results.append(new_node)
+        return results[0]
+
+    def type_of(self, node):
+        """Type of the value of <node>, None for an undeclared variable"""
+        if isinstance(node, ast.Num):
+            return "float" if isinstance(node.value, float) else "int"
+        if isinstance(node, ast.Var):
+            return self.types.get(node.name)
+        if isinstance(node, ast.Cast):
+            return node.type
+        if isinstance(node, ast.BinOp):
+            # Cached, otherwise typing nested operations would be quadratic in the depth
+            cached = self.binop_types.get(id(node))
+            if cached is not None:
+                return cached[1]
+
+            left_type, right_type = self.type_of(node.left), self.type_of(node.right)
+            if left_type is None or right_type is None:
+                type = None
+            else:
+                type = "float" if "float" in (left_type, right_type) else "int"
+            self.binop_types[id(node)] = (node, type)
+            return type
+        return "int"
+
+    def rewrite(self, node):
+        self.rewrites += 1
+        return node
+
+    def binop(self, node):
+        op, left, right = node.op, node.left, node.right
+
+        if isinstance(left, ast.Num) and isinstance(right, ast.Num):
+            value = fold(op, left.value, right.value)
+            if value is None:
+                return node
+            return self.rewrite(ast.Num(value))
+
+        if op in "+*" and isinstance(left, ast.Num):
+            return self.rewrite(self.binop(ast.BinOp(op, right, left)))
+
+        if not isinstance(right, ast.Num):
+            if op == "-" and isinstance(left, ast.Var) and left == right and self.type_of(left) == "int":
+                return self.rewrite(ast.Num(0))
+            return node
+
+        c = right.value
+        left_type = self.type_of(left)
+        if left_type is None:
+            return node
+        # Dropping c must not change the type of the result
+        same_type = left_type == "float" or isinstance(c, int)
+
+        if c == 0 and op in "+-" and same_type:
+            return self.rewrite(left)
+        if c == 1 and op in "*/" and same_type:
+            return self.rewrite(left)
+        if c == 0 and op == "*" and left_type == "int" and isinstance(c, int):
+            return self.rewrite(ast.Num(0))
+
+        if (op in "+*" and isinstance(left, ast.BinOp) and left.op == op and isinstance(left.right, ast.Num)
+                and left_type == "int" and isinstance(c, int)):
+            value = fold(op, left.right.value, c)
+            return self.rewrite(self.binop(ast.BinOp(op, left.left, ast.Num(value))))
+
+        if c == 2 and op == "*" and isinstance(left, ast.Var) and same_type:
+            return self.rewrite(ast.BinOp("+", left, left))
+
+        if op == "/" and c > 0 and math.frexp(c)[0] == 0.5 and (left_type == "float" or isinstance(c, float)):
+            return self.rewrite(ast.BinOp("*", left, ast.Num(1.0 / c)))
+
+        return node
+
+
+def fold(op, a, b):
+    """Compute a op b like the generated quads would, None if it can't be computed"""
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+
+    if b == 0:
+        return None
+    if isinstance(a, int) and isinstance(b, int):
+        # Integer division truncates toward zero
+        quotient = abs(a) // abs(b)
+        return quotient if (a < 0) == (b < 0) else -quotient
+    return a / b
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from batch import BatchExecutor
+from compiler import compile_ast
+from interpreter import QuadInterpreter
+from random_programs import random_inputs, random_program
+
+
+def compile_lines(text):
+    _, _, translator = compile_ast(text)
+    return translator.lines
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_same_outputs_as_interpreter(seed):
+    lines = compile_lines(random_program(seed))
+    inputs = random_inputs(seed, 30)
+
+    expected = [QuadInterpreter(lines).run(row) for row in inputs]
+    outputs = BatchExecutor(lines).run(inputs)
+
+    assert outputs.shape == (len(inputs), max(map(len, expected)))
+    for row, values in zip(outputs, expected):
+        assert row[:len(values)].tolist() == values
+        assert np.isnan(row[len(values):]).all()
+
+
+def test_rows_printing_different_counts():
+    lines = compile_lines("a, n: int; { input(a); while (n < a) { output(n); n = n + 1; } output(a * 10); }")
+    outputs = BatchExecutor(lines).run([[0], [3], [1]])
+    np.testing.assert_array_equal(outputs, [
+        [0, np.nan, np.nan, np.nan],
+        [0, 1, 2, 30],
+        [0, 10, np.nan, np.nan],
+    ])
+
+
+def test_not_enough_input_columns():
+    lines = compile_lines("a, b: int; { input(a); if (a > 0) { input(b); } output(a); }")
+    np.testing.assert_array_equal(BatchExecutor(lines).run([[0], [-1]]), [[0], [-1]])
+    with pytest.raises(EOFError, match="Not enough input columns"):
+        BatchExecutor(lines).run([[0], [1]])
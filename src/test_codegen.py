@@ -0,0 +1,34 @@
+import sys
+
+from ast_parser import CPLASTParser
+from codegen import CodeGenerator
+from complexity import gen_nesting
+from interpreter import QuadInterpreter
+from lexer import CPLLexer
+
+# Deeper than the recursion limit, which valid programs may be
+DEPTH = sys.getrecursionlimit() * 2
+
+
+def parse(text):
+    return CPLASTParser().parse(CPLLexer().tokenize(text))
+
+
+def test_long_expression():
+    terms = " + ".join(["a"] * DEPTH)
+    program = parse(f"a, b: int; {{ input(a); b = {terms}; output(b); }}")
+    lines = CodeGenerator().generate(program).lines
+    assert QuadInterpreter(lines).run([3]) == [3 * DEPTH]
+
+
+def test_deep_nesting():
+    lines = CodeGenerator().generate(parse(gen_nesting(DEPTH))).lines
+    assert QuadInterpreter(lines).run([0]) == [0]
+
+
+def test_deep_tree_repr_and_eq():
+    terms = " * ".join(["a"] * DEPTH)
+    text = f"a: float; {{ output({terms}); }}"
+    assert parse(text) == parse(text)
+    assert parse(text) != parse(text.replace("output(a", "output(2.0"))
+    assert repr(parse(text)).count("Var(name='a')") == DEPTH
@@ -0,0 +1,11 @@
+import pytest
+
+from complexity import PIPELINES, SCENARIOS, SIZES, check_scaling
+
+
+# The line counts are exact, so the smaller sizes are enough to tell linear from quadratic
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("pipeline", PIPELINES)
+def test_scaling(pipeline, scenario):
+    results = check_scaling(pipeline, [scenario], sizes=SIZES[:5])
+    assert all(passed for *_, passed in results), results
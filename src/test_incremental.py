@@ -0,0 +1,95 @@
+import random
+import re
+
+import pytest
+
+from compiler import compile_ast
+from complexity import gen_nesting, gen_statements
+from errors import BaseExc
+from incremental import IncrementalCompiler, edited_region
+from random_programs import random_program
+
+CONSTANT = re.compile(r"\b\d+\b")
+SIMPLE_STMT = re.compile(r"\b(?:input\(\w+\)|output\([^;]*\)|\w+ = [^;]*|break);")
+STMT_END = re.compile(r"[;{}]")
+
+
+def full_compile(text):
+    _, _, translator = compile_ast(text)
+    return translator.lines
+
+
+def random_edit(rng, text):
+    """<text> with a constant changed, a statement removed or inserted, a line break inserted
+    or some text cut, which may not compile"""
+    body = text.index("{")
+    constants = list(CONSTANT.finditer(text, body))
+    stmts = list(SIMPLE_STMT.finditer(text, body))
+    kind = rng.choice(["constant"] * bool(constants) + ["delete", "insert"] * bool(stmts) + ["newline", "cut"])
+    if kind in ("newline", "cut"):
+        where = rng.randrange(body, len(text))
+        if kind == "newline":
+            return text[:where] + "\n" + text[where:]
+        return text[:where] + text[where + rng.randrange(1, 20):]
+    if kind == "constant":
+        match = rng.choice(constants)
+        return text[:match.start()] + str(rng.randrange(100)) + text[match.end():]
+    if kind == "delete":
+        match = rng.choice(stmts)
+        return text[:match.start()] + text[match.end():]
+    where = rng.choice(list(STMT_END.finditer(text, body))).end()
+    return text[:where] + " " + rng.choice(stmts).group() + text[where:]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_random_edits(seed):
+    rng = random.Random(seed)
+    text = random_program(seed)
+    compiler = IncrementalCompiler()
+    assert compiler.compile(text).lines == full_compile(text)
+
+    for _ in range(20):
+        edited = random_edit(rng, text)
+        try:
+            expected = full_compile(edited)
+        except BaseExc:
+            # The compiler keeps its last compile
+            with pytest.raises(BaseExc):
+                compiler.compile(edited)
+            continue
+        assert compiler.compile(edited).lines == expected, edited
+        text = edited
+
+
+def compile_edit(text, edited):
+    compiler = IncrementalCompiler()
+    compiler.compile(text)
+    lines = compiler.compile(edited).lines
+    assert lines == full_compile(edited)
+    return compiler.last_region
+
+
+@pytest.mark.parametrize("old, new", [
+    ("b = a * 50 + b;", "b = a * 7 + b;"),
+    ("input(a); b = a * 50 + b;", "input(a); b = a * 50 + b; output(a);"),
+    ("input(a); b = a * 50 + b; output(b);", ""),
+    ("output(b);\ninput(a); b = a * 50 + b;", "output(b);\noutput(a);\ninput(a); b = a * 50 + b;"),
+])
+def test_edit_reparses_only_the_statements(old, new):
+    text = gen_statements(100)
+    start, end = compile_edit(text, text.replace(old, new, 1))
+    assert end - start <= len(new) + 40
+
+
+def test_edit_in_nested_loops():
+    text = gen_nesting(20)
+    edited = text.replace("b = b + a;", "b = b + a; output(a);", 1)
+    start, end = compile_edit(text, edited)
+    assert end - start < 100
+
+
+def test_edited_region():
+    assert edited_region("abcdef", "abXYef") == (2, 4, 4)
+    assert edited_region("abc", "abc") == (3, 3, 3)
+    assert edited_region("aaaa", "aaaaaa") == (4, 4, 6)
+    assert edited_region("abc", "") == (0, 3, 0)
@@ -0,0 +1,81 @@
+import pytest
+
+from ast_parser import CPLASTParser
+from codegen import CodeGenerator
+from interpreter import QuadInterpreter
+from lexer import CPLLexer
+from pgo import Profile
+from random_programs import random_inputs, random_program
+from simplify import Simplifier
+
+LOOP = """a, i, s: int;
+{
+    input(a);
+    i = 0;
+    while (i < a) {
+        if (i == 3) { s = s + 10; } else { s = s + i; }
+        i = i + 1;
+    }
+    output(s);
+}
+"""
+
+
+def parse(text):
+    return Simplifier().simplify(CPLASTParser().parse(CPLLexer().tokenize(text)))
+
+
+def run(generator, program, inputs):
+    """Outputs of each row of <inputs> and the interpreter that ran them"""
+    interpreter = QuadInterpreter(generator.generate(program).lines)
+    return [interpreter.run(row) for row in inputs], interpreter
+
+
+def check_layout(program, inputs):
+    """Instrument <program>, recompile it with its profile and return the taken jumps
+    before and after, checking the outputs don't change"""
+    generator = CodeGenerator()
+    outputs, interpreter = run(generator, program, inputs)
+    profile = Profile.collect(generator, interpreter)
+
+    pgo_outputs, pgo_interpreter = run(CodeGenerator(profile=profile), program, inputs)
+    assert pgo_outputs == outputs
+    return sum(interpreter.taken_counts), sum(pgo_interpreter.taken_counts)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_programs(seed):
+    taken, pgo_taken = check_layout(parse(random_program(seed)), random_inputs(seed, 30))
+    assert pgo_taken <= taken
+
+
+def test_hot_loop_and_else():
+    taken, pgo_taken = check_layout(parse(LOOP), [[10], [20], [0]])
+    assert pgo_taken < taken
+
+
+def test_save_and_load(tmp_path):
+    program = parse(LOOP)
+    generator = CodeGenerator()
+    _, interpreter = run(generator, program, [[10]])
+    profile = Profile.collect(generator, interpreter)
+    profile.save(tmp_path / "profile.json")
+    loaded = Profile.load(tmp_path / "profile.json")
+
+    assert loaded.matches(program)
+    assert CodeGenerator(profile=loaded).generate(program).lines == CodeGenerator(profile=profile).generate(program).lines
+
+
+def test_profile_of_another_program_is_ignored(capsys):
+    program = parse(LOOP)
+    generator = CodeGenerator()
+    _, interpreter = run(generator, program, [[10]])
+    profile = Profile.collect(generator, interpreter)
+
+    # A new while first: the ids of the old branches move by one onto branches of the same kind
+    edited = parse(LOOP.replace("i = 0;", "i = 0; while (i < 0) { i = i + 1; }", 1))
+    assert not profile.matches(edited)
+    capsys.readouterr()
+    lines = CodeGenerator(profile=profile).generate(edited).lines
+    assert "Ignoring the profile" in capsys.readouterr().out
+    assert lines == CodeGenerator().generate(edited).lines
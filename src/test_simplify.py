@@ -0,0 +1,80 @@
+import pytest
+
+import cpl_ast as ast
+from ast_parser import CPLASTParser
+from codegen import CodeGenerator
+from interpreter import QuadInterpreter
+from lexer import CPLLexer
+from random_programs import random_inputs, random_program
+from simplify import Simplifier, fold
+
+a, x = ast.Var("a"), ast.Var("x")
+
+
+def parse(text):
+    return CPLASTParser().parse(CPLLexer().tokenize(text))
+
+
+def run(program, inputs):
+    """Outputs of <program> for each row of <inputs>, with their type since a rewrite must keep it"""
+    interpreter = QuadInterpreter(CodeGenerator().generate(program).lines)
+    return [[(type(value), value) for value in interpreter.run(row)] for row in inputs]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_programs(seed):
+    program = parse(random_program(seed))
+    inputs = random_inputs(seed, 10)
+    assert run(Simplifier().simplify(program), inputs) == run(program, inputs)
+
+
+@pytest.mark.parametrize("expression, rewrites, expected", [
+    ("7 / 2", 1, ast.Num(3)),
+    ("1 - 8 / 3", 2, ast.Num(-1)),
+    ("7.0 / 2", 1, ast.Num(3.5)),
+    ("2 + a", 1, ast.BinOp("+", a, ast.Num(2))),
+    ("a + 2 + 3", 1, ast.BinOp("+", a, ast.Num(5))),
+    ("x + 2 + 3", 0, ast.BinOp("+", ast.BinOp("+", x, ast.Num(2)), ast.Num(3))),
+    ("a / 1", 1, a),
+    ("x + 0", 1, x),
+    ("a + 0.0", 0, ast.BinOp("+", a, ast.Num(0.0))),
+    ("a * 0", 1, ast.Num(0)),
+    ("x * 0", 0, ast.BinOp("*", x, ast.Num(0))),
+    ("a - a", 1, ast.Num(0)),
+    ("x - x", 0, ast.BinOp("-", x, x)),
+    ("a * 2", 1, ast.BinOp("+", a, a)),
+    ("x / 4", 1, ast.BinOp("*", x, ast.Num(0.25))),
+    ("a / 4", 0, ast.BinOp("/", a, ast.Num(4))),
+    ("x / 3", 0, ast.BinOp("/", x, ast.Num(3))),
+])
+def test_rewrites(expression, rewrites, expected):
+    program = parse(f"a: int; x: float; {{ input(a); input(x); output({expression}); }}")
+    simplifier = Simplifier()
+    simplified = simplifier.simplify(program)
+
+    assert repr(simplified.body.stmts[-1].expr) == repr(expected)
+    assert simplifier.rewrites == rewrites
+    inputs = [[-7, -2.5], [0, 0.0], [9, 6.0]]
+    assert run(simplified, inputs) == run(program, inputs)
+
+
+@pytest.mark.parametrize("op, left, right, expected", [
+    ("/", 7, 2, 3),
+    ("/", -7, 2, -3),
+    ("/", 7, -2, -3),
+    ("/", -7, -2, 3),
+    ("/", 7.0, 2, 3.5),
+    ("/", 7, 0, None),
+    ("-", 2, 5, -3),
+])
+def test_fold(op, left, right, expected):
+    assert fold(op, left, right) == expected
+
+
+def test_long_expression():
+    terms = " + ".join(["a"] * 3000)
+    program = parse(f"a, b: int; {{ b = {terms} + 1 + 2; }}")
+    simplifier = Simplifier()
+    simplified = simplifier.simplify(program)
+    assert simplifier.rewrites == 1
+    assert simplified.body.stmts[0].expr.right == ast.Num(3)